@@ -1,49 +1,269 @@
 from vosk import Model, KaldiRecognizer
-import wave
 import json
-import ffmpeg
 import os
+import functools
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# Путь к модели
-MODEL_PATH = "./voice_models/vosk-model-ru-0.42"
+import numpy as np
+import soundfile as sf
+import soxr
+
+# orjson (C-реализация) заметно быстрее stdlib json; зависимость опциональна
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Путь к модели; через VOSK_MODEL_PATH можно подставить другую сборку
+# (например, int8-квантованную) без правки кода. Разрешаем в абсолютный
+# один раз, чтобы дальше не дёргать getcwd
+MODEL_PATH = os.path.abspath(
+    os.environ.get("VOSK_MODEL_PATH", "./voice_models/vosk-model-ru-0.42"))
 INPUT_OGG = "audio.ogg"
-OUTPUT_WAV = "audio.wav"
-
-print("Start...")
-
-# 1. Загрузка модели
-if not os.path.isdir(MODEL_PATH):
-    raise FileNotFoundError(f"Модель не найдена: {os.path.abspath(MODEL_PATH)}")
-model = Model(MODEL_PATH)
-
-# 2. Конвертация OGG → WAV (16 кГц, моно, 16 бит PCM)
-ffmpeg.input(INPUT_OGG).output(
-    OUTPUT_WAV,
-    ar=16000,
-    ac=1,
-    acodec='pcm_s16le',
-    f='wav'
-).overwrite_output().run()
-
-# 3. Распознавание
-sample_rate = 16000
-rec = KaldiRecognizer(model, sample_rate)
-rec.SetWords(True)
-
-with wave.open(OUTPUT_WAV, "rb") as wf:
-    # Дополнительная проверка (опционально)
-    if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
-        raise ValueError("Аудиофайл должен быть моно, 16 бит, PCM")
 
+SAMPLE_RATE = 16000
+CHUNK = 8000  # 500 мс при 16 кГц — крупнее кусок, меньше накладных расходов Python
+
+SILENCE_RMS = 200.0   # порог энергии тишины для int16 PCM
+SILENCE_FLUSH = 8     # раз в N пропущенных кусков скармливаем короткую тишину
+PARTIAL_EVERY = 8     # как часто запрашивать PartialResult при стриминге
+_FLUSH_CHUNK = b"\x00" * 1600  # 50 мс нулей — дожимает недосказанные слова
+
+
+# Энергетическая проверка куска: numba убирает накладные расходы numpy
+# на коротких буферах; зависимость опциональна
+try:
+    from numba import njit
+
+    @njit(cache=True, fastmath=True)
+    def _mean_square(frame):
+        s = 0.0
+        for x in frame:
+            s += x * x
+        return s / frame.size
+
+    # прогреваем JIT на заглушке, чтобы компиляция не попала в горячий путь
+    _mean_square(np.zeros(CHUNK, dtype=np.int16))
+except ImportError:
+    def _mean_square(frame):
+        x = frame.astype(np.float32)
+        return float(np.mean(x * x))
+
+
+def is_speech_chunk(chunk):
+    """Дешёвая энергетическая проверка: есть ли в куске речь."""
+    return _mean_square(chunk) > SILENCE_RMS * SILENCE_RMS
+
+
+@functools.lru_cache(maxsize=1)
+def get_model():
+    """Лениво загружает модель один раз на процесс."""
+    if not os.path.isdir(MODEL_PATH):
+        raise FileNotFoundError(f"Модель не найдена: {MODEL_PATH}")
+    return Model(MODEL_PATH)
+
+
+_local = threading.local()
+
+
+def get_recognizer():
+    """Возвращает распознаватель потока; переиспользуем через Reset() —
+    это дешевле, чем строить KaldiRecognizer на каждый файл."""
+    rec = getattr(_local, "rec", None)
+    if rec is None:
+        rec = KaldiRecognizer(get_model(), SAMPLE_RATE)
+        rec.SetWords(True)
+        _local.rec = rec
+    else:
+        rec.Reset()
+    return rec
+
+
+def decode_audio(path):
+    """Декодирует файл в моно int16 16 кГц (libsndfile + soxr)."""
+    data, sr = sf.read(path, dtype='int16', always_2d=False)
+    if data.ndim == 2:
+        data = data.mean(axis=1).astype(np.int16)
+    if sr != SAMPLE_RATE:
+        data = soxr.resample(data, sr, SAMPLE_RATE, quality='QQ').astype(np.int16)
+    return data
+
+
+def ffmpeg_chunks(path):
+    """Декодирование через ffmpeg сразу в пайп (s16le, моно, 16 кГц) —
+    запасной путь для кодеков, которых нет в libsndfile; PCM идёт из
+    пайпа прямо в распознаватель, без промежуточного WAV на диске."""
+    import ffmpeg
+    # -loglevel error: в stderr попадают только ошибки, поэтому пайп
+    # не переполнится, пока мы читаем stdout
+    proc = ffmpeg.input(path).output(
+        'pipe:', format='s16le', ac=1, ar=SAMPLE_RATE
+    ).global_args('-loglevel', 'error').run_async(
+        pipe_stdout=True, pipe_stderr=True)
+    while (raw := proc.stdout.read(CHUNK * 2)):
+        yield np.frombuffer(raw, dtype=np.int16)
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise ffmpeg.Error('ffmpeg', None, stderr)
+
+
+def audio_chunks(path):
+    """Отдаёт куски моно int16 16 кГц по CHUNK отсчётов."""
+    try:
+        f = sf.SoundFile(path)
+    except sf.LibsndfileError:
+        # libsndfile не знает этот кодек — стримим через ffmpeg-пайп.
+        # Перехватываем только открытие: ошибка посреди чтения не должна
+        # перезапускать файл с нуля вторым декодером.
+        yield from ffmpeg_chunks(path)
+        return
+    with f:
+        if f.samplerate == SAMPLE_RATE and f.channels == 1:
+            # Уже моно 16 кГц: читаем потоково в заранее выделенный
+            # буфер вместо загрузки всего файла и свежего массива
+            # на каждый кусок.
+            buf = np.empty(CHUNK, dtype=np.int16)
+            while (n := f.buffer_read_into(buf, dtype='int16')):
+                yield buf[:n].copy()
+            return
+    data = decode_audio(path)
+    for i in range(0, len(data), CHUNK):
+        yield data[i:i + CHUNK]
+
+
+def transcribe(path, emit_partials=False):
+    """Распознаёт один файл и возвращает текст.
+
+    По умолчанию промежуточные Result() не парсим вовсе — итоговый текст
+    забираем одним FinalResult(); с emit_partials=True печатаем
+    PartialResult() каждый PARTIAL_EVERY-й кусок."""
+    # Декодирование в отдельном потоке, чтобы I/O и декодер libsndfile
+    # перекрывались с CPU-bound инференсом Kaldi. Очередь ограничена —
+    # producer блокируется, если распознавание не успевает (backpressure).
+    q = queue.Queue(maxsize=4)
+
+    def producer():
+        # Любая ошибка декодирования уходит в очередь и перебрасывается
+        # потребителем — иначе он навсегда зависнет на q.get() без EOF
+        try:
+            for chunk in audio_chunks(path):
+                q.put(chunk, block=True)
+        except Exception as e:
+            q.put(e)
+        else:
+            q.put(None)  # EOF
+
+    threading.Thread(target=producer, daemon=True).start()
+
+    rec = get_recognizer()
+
+    fed = 0
+    prev_silent = False
+    skipped = 0
     while True:
-        data = wf.readframes(4000)
-        if not data:
+        chunk = q.get()
+        if chunk is None:
             break
-        if rec.AcceptWaveform(data):
-            result = json.loads(rec.Result())
+        if isinstance(chunk, Exception):
+            raise chunk
+        # Куски сплошной тишины не гоняем через акустическую модель:
+        # пропускаем все, кроме первого (он закрывает последнее слово),
+        # изредка подкидывая короткий нулевой буфер для сброса состояния.
+        silent = not is_speech_chunk(chunk)
+        if silent and prev_silent:
+            skipped += 1
+            if skipped % SILENCE_FLUSH == 0:
+                rec.AcceptWaveform(_FLUSH_CHUNK)
+            continue
+        prev_silent = silent
+        rec.AcceptWaveform(chunk.tobytes())
+        fed += 1
+        if emit_partials and fed % PARTIAL_EVERY == 0:
+            partial = loads(rec.PartialResult()).get("partial")
+            if partial:
+                print(partial)
+
+    return loads(rec.FinalResult()).get("text", "")
+
+
+def _init_worker(counter):
+    # Привязываем воркер к отдельному ядру, чтобы внутренние потоки Kaldi
+    # не расползались по чужим ядрам, и сразу прогреваем модель. Номер
+    # воркера берём из общего счётчика: PID по модулю даёт коллизии.
+    if hasattr(os, "sched_setaffinity"):
+        with counter.get_lock():
+            idx = counter.value
+            counter.value += 1
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[idx % len(cpus)]})
+    get_model()
+
+
+def transcribe_parallel(paths):
+    """Оффлайн-пакет на CPU: по процессу на ядро, модель загружается
+    один раз на воркер — масштабируется почти линейно по ядрам."""
+    counter = multiprocessing.Value('i', 0)
+    with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                             initializer=_init_worker,
+                             initargs=(counter,)) as ex:
+        return dict(zip(paths, ex.map(transcribe, paths)))
+
+
+def transcribe_batch(paths):
+    """Распознаёт несколько файлов; на GPU-сборке vosk гонит все потоки
+    через BatchRecognizer параллельно, иначе — пулом процессов по ядрам."""
+    try:
+        from vosk import BatchModel, BatchRecognizer, GpuInit
+        GpuInit()
+        batch_model = BatchModel(MODEL_PATH)
+    except Exception:
+        return transcribe_parallel(paths)
+
+    recs = {}
+    streams = {}
+    for path in paths:
+        recs[path] = BatchRecognizer(batch_model, SAMPLE_RATE)
+        streams[path] = decode_audio(path)
+
+    offsets = dict.fromkeys(paths, 0)
+    while streams:
+        for path in list(streams):
+            data = streams[path]
+            i = offsets[path]
+            recs[path].AcceptWaveform(data[i:i + CHUNK].tobytes())
+            offsets[path] = i + CHUNK
+            if offsets[path] >= len(data):
+                recs[path].FinishStream()
+                del streams[path]
+    batch_model.Wait()
+
+    results = {}
+    for path in paths:
+        texts = []
+        while (res := recs[path].Result()):
+            result = loads(res)
             if "text" in result and result["text"]:
-                print(result["text"])
+                texts.append(result["text"])
+        results[path] = " ".join(texts)
+    return results
+
 
-    final_result = json.loads(rec.FinalResult())
-    if "text" in final_result and final_result["text"]:
-        print(final_result["text"])
\ No newline at end of file
+if __name__ == "__main__":
+    print("Start...")
+    paths = sys.argv[1:] or [INPUT_OGG]
+    # perf_counter — монотонный таймер без аллокаций datetime-объектов
+    t0 = time.perf_counter()
+    if len(paths) == 1:
+        text = transcribe(paths[0])
+        if text:
+            print(text)
+    else:
+        for path, text in transcribe_batch(paths).items():
+            print(f"{path}: {text}")
+    print(f"Готово за {time.perf_counter() - t0:.3f} с")